@@ -1,8 +1,9 @@
-import httpx, time, tempfile, shutil
+import httpx, time, tempfile, shutil, hashlib
 from pathlib import Path
 from watchdog.events import FileSystemEvent, PatternMatchingEventHandler, FileMovedEvent
 from watchdog.observers import Observer
 from dependencies.util import parseArguments, stripPath
+from dependencies.pathstate import PathStateStore
 
 
 
@@ -17,11 +18,16 @@ However there are limitations and caveats to be aware of which are documented in
 
 Uses httpx for making HTTP requests to a fastAPI server running at "http://localhost:8000". The code for the server is located as `server/server.py` file.
 
+When several roots are watched from one process each root gets its own event handler tagged with the root name.
+The root name is sent with every request so the server can apply the change to the matching namespace.
+All handlers share a single httpx client (and therefore its connection pool) and a single Observer.
+Note the Observer only shares the dispatch thread - watchdog starts one emitter thread per scheduled root (one inotify instance per root on Linux).
+
 Documentation for Watchdog: https://python-watchdog.readthedocs.io/en/stable/
 Documentation for httpx: https://www.python-httpx.org/
 '''
 class MyEventHandler(PatternMatchingEventHandler):
-    def __init__(self, topLevelDirectory: str, client: httpx.Client):
+    def __init__(self, topLevelDirectory: str, client: httpx.Client, root: str | None = None):
         super().__init__(
             ignore_patterns=[
                 "*.tmp",  # Common Windows temp file pattern
@@ -36,6 +42,50 @@ class MyEventHandler(PatternMatchingEventHandler):
         )
         self.topLevelDir = topLevelDirectory
         self.client = client
+        self.root = root
+        # Size + mtime of every file last uploaded successfully - used to skip duplicate modified events
+        # Files uploaded within `racyWindowNs` of their mtime also get a content digest - see `isRacy`
+        self.state = PathStateStore()
+
+    # FAT / exFAT store mtimes to 2 seconds and network shares can be similarly coarse - allow some slack on top
+    racyWindowNs = 3_000_000_000
+
+
+    '''
+    Helper function to check whether a file's mtime is too recent to trust
+    On filesystems with coarse mtimes a same-size rewrite shortly after an upload can keep the same mtime ("racily clean" in git's terms)
+    For these files size + mtime alone cannot tell us the file is unchanged so we also record a digest of the uploaded content
+    '''
+    def isRacy(self, mtimeNs: int):
+        return time.time_ns() - mtimeNs < self.racyWindowNs
+
+
+    '''
+    Helper function to compute the 64 bit digest stored in the path state
+    Input:
+    - source: the file contents as bytes or a path to the file to be read in chunks
+    Never returns 0 as 0 is stored for "no digest"
+    '''
+    @staticmethod
+    def contentDigest(source):
+        digest = hashlib.blake2b(digest_size=8)
+        if isinstance(source, bytes):
+            digest.update(source)
+        else:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        return int.from_bytes(digest.digest(), "big") or 1
+
+
+    '''
+    Helper function to build the form / query data for a request
+    Adds the root name when this handler is watching a named root so the server can pick the matching namespace
+    '''
+    def requestData(self, **fields):
+        if self.root is not None:
+            fields["root"] = self.root
+        return fields
 
 
     '''
@@ -59,8 +109,8 @@ class MyEventHandler(PatternMatchingEventHandler):
         Currently we consider files larger than 10_000 bytes to be large files. Whilst this is a rather small size it is good for testing purposes and can be adjusted later if needed.
 
         Input:
-        - dataPath: Dictionary containing the subPath for the file
-            - example: {"subPath": "foo/New Text Document.txt"}
+        - dataPath: Dictionary containing the subPath for the file (and the root name when watching a named root)
+            - example: {"subPath": "foo/New Text Document.txt", "root": "projects"}
         - srcPath: String The full path to the source file to be sent 
             - example: "C:\\Users\\Username\\Documents\\Projects\\DropBox\\source_test\\foo\\New Text Document.txt"#
 
@@ -72,8 +122,12 @@ class MyEventHandler(PatternMatchingEventHandler):
     # https://github.com/syncthing/syncthing - A similar Open Source Project - creates a copy of the file and then uploads that
     def sendFile(self, dataPath: dict, srcPath: str):
         try:
-            fileSize = Path(srcPath).stat().st_size
+            # Stat before sending - if the file changes mid upload the next modified event will not match and be re-sent
+            stat = Path(srcPath).stat()
+            fileSize = stat.st_size
             filename = Path(srcPath).name
+            # The digest must be of the content actually uploaded - not the file as it is after the upload
+            digest = 0
 
             # Small file < 10_000 bytes —> read into memory
             if fileSize < 10_000:
@@ -85,6 +139,8 @@ class MyEventHandler(PatternMatchingEventHandler):
                     "http://localhost:8000/uploadfile", files=files, data=dataPath
                 )
                 self.logResponse(r, "File Upload Small")
+                if r.status_code == 200 and self.isRacy(stat.st_mtime_ns):
+                    digest = self.contentDigest(fileBytes)
 
             # Large file >= 10_000 bytes —> stream it
             # To solve a race condition with streamed files where the file grows or shrinks during sending
@@ -103,9 +159,14 @@ class MyEventHandler(PatternMatchingEventHandler):
                         "http://localhost:8000/uploadfile", files=files, data=dataPath
                     )
                 self.logResponse(r, "File Upload Large")
+                if r.status_code == 200 and self.isRacy(stat.st_mtime_ns):
+                    digest = self.contentDigest(tempCopyPath)
 
                 tempCopyPath.unlink(missing_ok=True)
 
+            if r.status_code == 200:
+                self.state.set(dataPath["subPath"], fileSize, stat.st_mtime_ns, digest)
+
         except Exception as e:
             print(f"Error sending file: {e}")
             return None
@@ -113,6 +174,25 @@ class MyEventHandler(PatternMatchingEventHandler):
         return r
 
 
+    '''
+    Helper function to check whether a file matches the state recorded when it was last uploaded
+    Editors and Windows commonly fire several modified events for a single save - only the first needs uploading
+    Files that were racy when uploaded (see `isRacy`) are only treated as unchanged if their content digest also matches
+    '''
+    def isUnchanged(self, subPath: str, srcPath: str):
+        recorded = self.state.get(subPath)
+        if recorded is None:
+            return False
+        size, mtime, digest = recorded
+        try:
+            stat = Path(srcPath).stat()
+            if (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+                return False
+            return digest == 0 or digest == self.contentDigest(srcPath)
+        except OSError:
+            return False
+
+
     '''
         Watchdog event handler method
         Specific documenation for this method is available in the official watchdog documentation
@@ -151,10 +231,10 @@ class MyEventHandler(PatternMatchingEventHandler):
         oldPath = stripPath(event.src_path, self.topLevelDir)
         newPath = stripPath(event.dest_path, self.topLevelDir)
 
-        data = {
-            "oldSubPath": str(oldPath),
-            "newSubPath": str(newPath),
-        }
+        data = self.requestData(
+            oldSubPath=str(oldPath),
+            newSubPath=str(newPath),
+        )
 
         if not (event.is_directory):
             print("FILE MOVED")
@@ -164,7 +244,9 @@ class MyEventHandler(PatternMatchingEventHandler):
                     "http://localhost:8000/renamefile", data=data
                     )
                 self.logResponse(r, "File Rename / Move")
+                self.updateMovedState(r, oldPath, newPath)
             except Exception as e:
+                self.state.remove(oldPath)
                 print(f"Error sending rename request: {e}")
         # High Level Directory Rename Behavior:
         # Will never fire on a windows implementation
@@ -176,12 +258,26 @@ class MyEventHandler(PatternMatchingEventHandler):
                     "http://localhost:8000/renamedirectory", data=data
                 )
                 self.logResponse(r, "Directory Rename / Move")
+                self.updateMovedState(r, oldPath, newPath)
             except Exception as e:
+                self.state.remove(oldPath)
                 print(f"Error sending directory rename request: {e}")
 
         return super().on_moved(event)
 
 
+    '''
+    Helper function to keep the recorded state in line with a rename / move
+    On success the state follows the file (or directory subtree) - otherwise it is dropped so the file is re-uploaded on its next change
+    High Level Directory Rename Behavior: the sub-directory / file renames returning 404 are no-ops as the parent has already been moved
+    '''
+    def updateMovedState(self, response: httpx.Response, oldPath: Path, newPath: Path):
+        if response.status_code == 200:
+            self.state.move(oldPath, newPath)
+        else:
+            self.state.remove(oldPath)
+
+
     '''
         Watchdog event handler method
         Specific documenation for this method is available in the official watchdog documentation
@@ -193,7 +289,7 @@ class MyEventHandler(PatternMatchingEventHandler):
 
         # strip the top level directory from the path to get the path relative to the top level directory
         subPath = stripPath(event.src_path, self.topLevelDir)
-        data = {"subPath": str(subPath)}
+        data = self.requestData(subPath=str(subPath))
 
         if not (event.is_directory):
             print("FILE CREATED ")
@@ -231,7 +327,9 @@ class MyEventHandler(PatternMatchingEventHandler):
 
         # strip the top level directory from the path to get the path relative to the top level directory
         destinationPath = stripPath(event.src_path, self.topLevelDir)
-        dataPath = {"subPath": str(destinationPath)}
+        dataPath = self.requestData(subPath=str(destinationPath))
+        # Forget the file (or the whole directory) - a re-created file will always be uploaded
+        self.state.remove(destinationPath)
 
         if not (event.is_directory):
             print("FILE DELETED ")
@@ -285,7 +383,10 @@ class MyEventHandler(PatternMatchingEventHandler):
             print(event)
             # strip the top level directory from the path to get the path relative to the top level directory
             destinationPath = stripPath(event.src_path, self.topLevelDir)
-            dataPath = {"subPath": str(destinationPath)}
+            dataPath = self.requestData(subPath=str(destinationPath))
+            if self.isUnchanged(dataPath["subPath"], event.src_path):
+                print(f"File unchanged since last upload: {destinationPath}")
+                return super().on_modified(event)
             # Send the file to the server - logging handled in `sendFile`
             success = self.sendFile(dataPath=dataPath, srcPath=event.src_path)
             if success is None:
@@ -299,22 +400,27 @@ class MyEventHandler(PatternMatchingEventHandler):
 Main entry point for the client application
 
 Starts the Watchdog observer to listen for events
+Every watched root is scheduled on the same observer and shares the same HTTP client
+One dispatch thread handles every root's events - but each root still gets its own watchdog emitter thread
 Graceful shutdown on keyboard interrupt
 '''
 if __name__ == "__main__":
-    # Handles command line arguments to specify the directory to watch
-    source = parseArguments()
-    topLevelDir = Path(source).name
-    print(topLevelDir)
+    # Handles command line arguments to specify the directory (or directories via a config file) to watch
+    roots = parseArguments()
 
     with httpx.Client() as client:
-        # Sets up the Watchdog event handler 
-        # Passes the top-level directory and HTTP client to the event handler
-        event_handler = MyEventHandler(topLevelDirectory=topLevelDir, client=client)
-
-        # Create an Observer where we can schedule our Watchdog event handler to listen for file system events
+        # Create an Observer where we can schedule our Watchdog event handlers to listen for file system events
         observer = Observer()
-        observer.schedule(event_handler=event_handler, path=source, recursive=True)
+
+        for root, source in roots.items():
+            topLevelDir = Path(source).name
+            print(f"Watching {source} as root: {root}")
+
+            # Sets up a Watchdog event handler per root
+            # Passes the top-level directory, root name and the shared HTTP client to the event handler
+            event_handler = MyEventHandler(topLevelDirectory=topLevelDir, client=client, root=root)
+            observer.schedule(event_handler=event_handler, path=source, recursive=True)
+
         observer.start()
 
         print("Press Ctrl+C to exit.")
@@ -0,0 +1,407 @@
+import argparse, httpx, json, os, shutil, tempfile, time
+from pathlib import Path
+from dependencies.util import checkDirectory
+
+
+
+'''
+Raised when the change feed names a path outside the follower's destination directory
+These events can never be applied so they are skipped rather than retried
+'''
+class UnsafePathError(ValueError):
+    pass
+
+
+'''
+Parses a position printed by (or saved from) a previous run - `feedId:sequence` or a bare sequence
+Returns (feedId, sequence) - feedId is None for a bare sequence and None is returned for anything unparsable
+'''
+def parsePosition(position: str):
+    feedId, _, sequence = position.strip().rpartition(":")
+    if not sequence.isdigit():
+        return None
+    return (feedId or None, int(sequence))
+
+
+'''
+Follower (subscriber) mode for the client
+
+Follows the change feed of a server running at "http://localhost:8000" and applies every committed operation to a local directory.
+This lets several machines mirror one server without scanning directories - changes arrive as soon as the server commits them.
+
+The feed is a Server-Sent Events stream from the `/changes` endpoint in `server/server.py`.
+Each event carries a position (`feedId:sequence`) - the follower remembers the last position it applied, saves it to a state file next to the mirror
+and resumes from it when the connection drops or the follower is restarted.
+When there is no position to resume from (a new follower, a server restart or a follower that fell too far behind) the server sends a `reset`
+and the follower reconciles the whole mirror against a listing of the server from the `/listtree` endpoint.
+Uploaded files are fetched from the `/downloadfile` endpoint.
+
+Documentation for Server-Sent Events: https://html.spec.whatwg.org/multipage/server-sent-events.html
+Documentation for httpx streaming: https://www.python-httpx.org/quickstart/#streaming-responses
+'''
+class ChangeFollower:
+    # Attempts at applying a change before falling back to bringing its paths in line with the server
+    maxAttempts = 3
+
+    def __init__(
+        self, destination: str, client: httpx.Client, root: str | None = None,
+        since: int | None = None, feedId: str | None = None, statePath: Path | None = None,
+    ):
+        self.destination = Path(destination).resolve()
+        self.client = client
+        self.root = root
+        # None when we have no position - the server sends a reset and the whole mirror is reconciled
+        self.sequence = since
+        self.feedId = feedId
+        self.statePath = statePath
+        self.failedSequence = None
+        self.failures = 0
+
+
+    '''
+    Helper function to build the query parameters for a request
+    Adds the root name when following a named root
+    '''
+    def requestParams(self, **fields):
+        if self.root is not None:
+            fields["root"] = self.root
+        return fields
+
+
+    '''
+    Helper function to join a sub path from the feed onto the destination directory
+    Absolute paths and `..` components would otherwise let the feed write anywhere the follower can
+    '''
+    def localPath(self, subPath: str) -> Path:
+        targetPath = (self.destination / subPath).resolve()
+        if targetPath == self.destination or not targetPath.is_relative_to(self.destination):
+            raise UnsafePathError(f"Path outside of the destination directory: {subPath}")
+        return targetPath
+
+
+    '''
+    Downloads a file into the local mirror
+    The file is streamed into a temp file in the same directory and then moved into place
+    so a partially downloaded file is never visible at the destination path
+
+    Returns:
+    - True if the file was downloaded
+    - False if the file no longer exists on the server
+    '''
+    def downloadFile(self, subPath: str):
+        destinationPath = self.localPath(subPath)
+
+        with self.client.stream(
+            "GET", "http://localhost:8000/downloadfile", params=self.requestParams(subPath=subPath)
+        ) as r:
+            # The file has since been deleted or renamed on the server
+            # A later delete needs nothing from us and a later rename fetches the file from its new path with `syncTree`
+            if r.status_code == 404:
+                print(f"[Download] Not found: {subPath}")
+                return False
+            r.raise_for_status()
+
+            destinationPath.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=destinationPath.parent, delete=False) as tmp:
+                tempPath = Path(tmp.name)
+                try:
+                    for chunk in r.iter_bytes():
+                        tmp.write(chunk)
+                except Exception:
+                    tmp.close()
+                    tempPath.unlink(missing_ok=True)
+                    raise
+        os.replace(tempPath, destinationPath)
+        return True
+
+
+    '''
+    Helper function to remove a local file or directory
+    '''
+    @staticmethod
+    def removeLocal(path: Path):
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        else:
+            path.unlink(missing_ok=True)
+
+
+    '''
+    Brings a file or directory in the local mirror in line with the server
+    Fetches a listing of the subtree and downloads every file that is missing locally or has a different size
+
+    Used after a rename - uploads applied while behind may have returned 404 as the file had already been renamed on the server
+
+    With `prune` the local entries are made to match the server exactly - local entries the server does not have are deleted,
+    and local files standing where the server has a directory (or the other way round) are replaced.
+    `subPath=""` with `prune` reconciles the whole mirror.
+    '''
+    def syncTree(self, subPath: str = "", prune: bool = False):
+        r = self.client.get("http://localhost:8000/listtree", params=self.requestParams(subPath=subPath))
+        # Renamed or deleted again since - a later event covers it
+        if r.status_code == 404:
+            if prune and subPath:
+                self.removeLocal(self.localPath(subPath))
+            return
+        r.raise_for_status()
+        listing = r.json()
+
+        basePath = self.localPath(subPath) if subPath else self.destination
+        directories = {self.localPath(directory) for directory in listing["directories"]}
+        files = {self.localPath(file["subPath"]): file for file in listing["files"]}
+
+        if prune:
+            # The server has this path so anything above it must be a directory - replace any local file in the way
+            for parent in reversed(basePath.parents):
+                if parent.is_relative_to(self.destination) and parent != self.destination and parent.is_file():
+                    parent.unlink()
+
+            if basePath != self.destination and basePath.exists():
+                if (basePath.is_dir() and basePath in files) or (not basePath.is_dir() and basePath in directories):
+                    self.removeLocal(basePath)
+
+            if basePath.is_dir():
+                # Deepest first so directories are emptied before they are checked
+                for path in sorted(basePath.rglob("*"), reverse=True):
+                    if not os.path.lexists(path):
+                        continue
+                    if path.is_dir() and not path.is_symlink():
+                        if path not in directories:
+                            shutil.rmtree(path)
+                    elif path not in files:
+                        path.unlink()
+
+        for directory in sorted(directories):
+            directory.mkdir(parents=True, exist_ok=True)
+        for localFile, file in files.items():
+            if not localFile.is_file() or localFile.stat().st_size != file["size"]:
+                self.downloadFile(file["subPath"])
+
+
+    '''
+    Reconciles the whole mirror with the server
+    Used when the operations since our position cannot be replayed - a reset from the server or no position at all
+    '''
+    def resync(self):
+        print("Reconciling the mirror with the server")
+        self.syncTree("", prune=True)
+
+
+    '''
+    Brings every path named by a change in line with the server
+    Used when a change keeps failing locally - e.g. a `mkdir` over a local file or a download below a local file
+    '''
+    def recoverChange(self, event: dict):
+        for key in ["subPath", "oldSubPath", "newSubPath"]:
+            if event.get(key):
+                self.syncTree(event[key], prune=True)
+
+
+    '''
+    Applies a single operation from the change feed to the local mirror
+
+    Input:
+        - event: Dictionary describing the operation
+            - example: {"sequence": 12, "op": "rename", "root": null, "oldSubPath": "foo", "newSubPath": "bar"}
+    '''
+    def applyChange(self, event: dict):
+        op = event["op"]
+
+        if op == "upload":
+            self.downloadFile(event["subPath"])
+
+        # The server sends a single "delete" for both files and directories
+        elif op == "delete":
+            targetPath = self.localPath(event["subPath"])
+            if targetPath.is_dir():
+                shutil.rmtree(targetPath)
+            else:
+                targetPath.unlink(missing_ok=True)
+
+        elif op == "rename":
+            oldPath = self.localPath(event["oldSubPath"])
+            newPath = self.localPath(event["newSubPath"])
+            if oldPath.exists():
+                newPath.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(oldPath), str(newPath))
+            # When behind, the upload events for this path may have 404'd (the file was already renamed on the server)
+            # or the old path may never have reached us - fetch anything still missing from the new path
+            self.syncTree(event["newSubPath"])
+
+        elif op == "mkdir":
+            self.localPath(event["subPath"]).mkdir(parents=True, exist_ok=True)
+
+        else:
+            print(f"Unknown operation in change feed: {op}")
+
+
+    '''
+    The current position in the feed as sent in `Last-Event-ID` - `feedId:sequence`
+    None when we have no position yet
+    '''
+    def position(self):
+        if self.sequence is None:
+            return None
+        return f"{self.feedId}:{self.sequence}" if self.feedId else str(self.sequence)
+
+
+    '''
+    Saves the current position to the state file so a restarted follower resumes where it left off
+    Written to a temp file and moved into place so a crash never leaves a partial position behind
+    '''
+    def savePosition(self):
+        if self.statePath is None or self.position() is None:
+            return
+        tempPath = self.statePath.with_name(self.statePath.name + ".tmp")
+        tempPath.write_text(self.position())
+        os.replace(tempPath, self.statePath)
+
+
+    '''
+    Streams the change feed and applies each event until the connection drops
+    Events are parsed as described by the Server-Sent Events spec - an event is complete at a blank line
+    '''
+    def follow(self):
+        headers = {"Accept": "text/event-stream"}
+        # With no position we ask for a sequence before any the server holds - it replies with a reset and we reconcile the mirror
+        params = {"since": -1}
+        if self.position() is not None:
+            headers["Last-Event-ID"] = self.position()
+            params["since"] = self.sequence
+        if self.feedId:
+            params["feed"] = self.feedId
+        # No read timeout - the server sends a progress event when idle and we want to wait for changes indefinitely
+        timeout = httpx.Timeout(10.0, read=None)
+
+        with self.client.stream(
+            "GET", "http://localhost:8000/changes", params=self.requestParams(**params),
+            headers=headers, timeout=timeout,
+        ) as r:
+            r.raise_for_status()
+            eventType, eventId, data = "message", "", []
+            for line in r.iter_lines():
+                if line == "":
+                    if data:
+                        self.handleEvent(eventType, eventId, "\n".join(data))
+                    eventType, eventId, data = "message", "", []
+                elif line.startswith(":"):
+                    continue
+                elif line.startswith("event:"):
+                    eventType = line[len("event:"):].strip()
+                elif line.startswith("id:"):
+                    eventId = line[len("id:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+
+
+    '''
+    Handles a complete event from the change feed
+    The position only advances (and is saved) once the event has been applied - errors are raised with the position left in place
+    so the follower reconnects and retries the event.
+    Events naming a path outside the destination can never be applied and are skipped.
+    '''
+    def handleEvent(self, eventType: str, eventId: str, data: str):
+        payload = json.loads(data)
+        feedId = eventId.rpartition(":")[0] or self.feedId
+
+        # The server no longer holds the operations we missed (a new follower, a server restart or we fell too far behind)
+        # They cannot be replayed so the whole mirror is reconciled with the server instead
+        if eventType == "reset":
+            print(f"Change feed reset at {feedId}:{payload['sequence']}")
+            self.resync()
+
+        # Progress events only move our position past operations for other roots
+        elif eventType == "change":
+            print(f"[{feedId}:{payload['sequence']}] {payload['op'].upper()} {payload.get('subPath') or payload.get('oldSubPath')}")
+            self.applyWithRetry(payload)
+
+        self.feedId = feedId
+        self.sequence = payload["sequence"]
+        self.savePosition()
+
+
+    '''
+    Applies a change - retrying local failures up to `maxAttempts` times
+    A change that keeps failing locally (e.g. the mirror has drifted and a local file stands where the server has a directory)
+    falls back to bringing its paths in line with the server. If that fails as well the change is skipped so later changes are not held up.
+    Connection errors are always raised so the change is retried once we reconnect.
+    '''
+    def applyWithRetry(self, event: dict):
+        try:
+            self.applyChange(event)
+        except UnsafePathError as e:
+            print(f"Skipping change {event['sequence']}: {e}")
+        except OSError as e:
+            if self.failedSequence != event["sequence"]:
+                self.failedSequence, self.failures = event["sequence"], 0
+            self.failures += 1
+            if self.failures < self.maxAttempts:
+                raise
+
+            print(f"Change {event['sequence']} failed {self.failures} times: {e} - bringing its paths in line with the server")
+            try:
+                self.recoverChange(event)
+            except (OSError, UnsafePathError) as recoverError:
+                print(f"Skipping change {event['sequence']}: {recoverError} - the mirror may differ from the server at this path")
+
+
+
+'''
+Main entry point for the follower
+
+Follows the change feed until a keyboard interrupt - reconnecting with a backoff whenever the connection drops
+'''
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-path")
+    parser.add_argument("-root")
+    parser.add_argument("-since")
+    args = parser.parse_args()
+
+    # Check that Arguments were actually passed
+    if args.path is None:
+        raise ValueError("Bad Arguments passed please use: -path pathName [-root rootName] [-since feedId:sequence]")
+    destination = checkDirectory(args.path)
+
+    # The position is saved next to (not inside) the mirror so it is never mistaken for a mirrored file
+    mirrorPath = Path(destination).resolve()
+    statePath = mirrorPath.parent / f".{mirrorPath.name}.follower"
+
+    # `-since` takes a position printed by a previous run - otherwise resume from the state file
+    # With neither the whole mirror is reconciled with the server before following
+    position = None
+    if args.since is not None:
+        position = parsePosition(args.since)
+        if position is None:
+            raise ValueError("Bad Arguments passed please use: -since feedId:sequence")
+    elif statePath.is_file():
+        position = parsePosition(statePath.read_text())
+    feedId, sequence = position or (None, None)
+
+    with httpx.Client() as client:
+        follower = ChangeFollower(
+            destination=destination, client=client, root=args.root, since=sequence, feedId=feedId, statePath=statePath
+        )
+
+        print(f"Following from {follower.position() or 'a full resync'} - Press Ctrl+C to exit.")
+        delay = 1
+        try:
+            while True:
+                before = follower.position()
+                try:
+                    follower.follow()
+                    print("Change feed closed by the server")
+                except httpx.HTTPError as e:
+                    print(f"Change feed disconnected: {e}")
+                except OSError as e:
+                    print(f"Error applying change after {follower.position()}: {e}")
+
+                # Back off until we make progress again - this covers a server closing the stream straight away as well as repeated errors
+                if follower.position() != before:
+                    delay = 1
+                print(f"Resuming from {follower.position() or 'a full resync'} in {delay}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+        except KeyboardInterrupt:
+            print(f"KeyboardInterrupt received. Stopped at {follower.position()} (saved to {statePath})")
+        exit(0)
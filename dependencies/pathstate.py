@@ -0,0 +1,237 @@
+import sys
+from array import array
+from pathlib import PurePath
+
+'''
+Compact in-memory store for per-file state on the client
+
+Keying state by full `Path` objects (as built by `stripPath`) costs several hundred bytes per file - every Path holds its own
+string, its parts tuple and every component string. With a few million tracked files this becomes gigabytes of memory.
+
+Instead the store keeps a trie of nodes where each node only knows its parent id and its own name:
+    - Directory names are interned - "src", "docs" etc. are stored once no matter how many directories share the name
+    - Each directory node has a small dictionary of name -> child node id, created only once the directory has children
+    - The per-node records (parent, size, mtime, hash) are stored in typed `array`s rather than one Python object per file
+
+Renaming a directory only re-links a single node, as every descendant refers to it by id rather than by its full path.
+Removing a directory only walks its own subtree. Ids of removed nodes are recycled through a free list.
+
+Node 0 is the root of the tree (the top level watched directory).
+'''
+class PathStateStore:
+    __slots__ = (
+        "names",
+        "children",
+        "parent",
+        "tracked",
+        "size",
+        "mtime",
+        "digest",
+        "free",
+        "count",
+    )
+
+    ROOT = 0
+
+    def __init__(self):
+        self.names: list[str | None] = [""]
+        self.children: dict[int, dict[str, int]] = {}
+        self.parent = array("l", [-1])
+        self.tracked = array("b", [0])
+        self.size = array("q", [0])
+        self.mtime = array("q", [0])
+        self.digest = array("Q", [0])
+        self.free: list[int] = []
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, path):
+        node = self.findNode(path)
+        return node is not None and self.tracked[node] == 1
+
+    '''
+    Helper function to split a path into its components
+    Accepts strings or Path objects relative to the top level directory
+    '''
+    @staticmethod
+    def splitPath(path):
+        return PurePath(path).parts
+
+    '''
+    Returns the node id for a path or None if the path has never been stored
+    '''
+    def findNode(self, path):
+        node = self.ROOT
+        for component in self.splitPath(path):
+            entries = self.children.get(node)
+            if entries is None:
+                return None
+            node = entries.get(component)
+            if node is None:
+                return None
+        return node
+
+    def newNode(self, parentId: int, name: str) -> int:
+        if self.free:
+            node = self.free.pop()
+            self.names[node] = name
+            self.parent[node] = parentId
+            self.tracked[node] = 0
+            self.size[node] = 0
+            self.mtime[node] = 0
+            self.digest[node] = 0
+        else:
+            node = len(self.parent)
+            self.names.append(name)
+            self.parent.append(parentId)
+            self.tracked.append(0)
+            self.size.append(0)
+            self.mtime.append(0)
+            self.digest.append(0)
+        self.children.setdefault(parentId, {})[name] = node
+        return node
+
+    '''
+    Returns the node id for a path - creating any missing nodes along the way
+    Only the directory components are interned - file names are usually unique so interning them would only add overhead
+    '''
+    def ensureNode(self, path) -> int:
+        parts = self.splitPath(path)
+        node = self.ROOT
+        for depth, component in enumerate(parts):
+            entries = self.children.get(node)
+            child = None if entries is None else entries.get(component)
+            if child is None:
+                isDirectory = depth < len(parts) - 1
+                child = self.newNode(node, sys.intern(component) if isDirectory else component)
+            node = child
+        return node
+
+    '''
+    Stores the state for a file
+    Input:
+        path: Path relative to the top level directory - example: "foo/New Text Document.txt"
+        size: File size in bytes
+        mtime: Modification time in nanoseconds (`os.stat_result.st_mtime_ns`)
+        digest: Optional 64 bit content hash - 0 when unknown
+    '''
+    def set(self, path, size: int, mtime: int, digest: int = 0):
+        node = self.ensureNode(path)
+        if not self.tracked[node]:
+            self.tracked[node] = 1
+            self.count += 1
+        self.size[node] = size
+        self.mtime[node] = mtime
+        self.digest[node] = digest
+
+    '''
+    Returns the (size, mtime, digest) stored for a path or None if the path is not tracked
+    '''
+    def get(self, path):
+        node = self.findNode(path)
+        if node is None or not self.tracked[node]:
+            return None
+        return (self.size[node], self.mtime[node], self.digest[node])
+
+    '''
+    Unlinks a node from its parent's children - dropping the parent's dictionary once it is empty
+    '''
+    def unlink(self, node: int):
+        parentId = self.parent[node]
+        entries = self.children[parentId]
+        del entries[self.names[node]]
+        if not entries:
+            del self.children[parentId]
+
+    '''
+    Releases a node and its whole subtree back to the free list
+    '''
+    def releaseTree(self, node: int):
+        self.unlink(node)
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            entries = self.children.pop(current, None)
+            if entries:
+                pending.extend(entries.values())
+            if self.tracked[current]:
+                self.count -= 1
+            self.tracked[current] = 0
+            self.names[current] = None
+            self.parent[current] = -1
+            self.free.append(current)
+
+    '''
+    Releases untracked nodes that no longer have any children - walking up from `node` towards the root
+    Stops intermediate directory nodes from building up as files are removed or moved away
+    '''
+    def pruneEmpty(self, node: int):
+        while node != self.ROOT and not self.tracked[node] and node not in self.children:
+            parentId = self.parent[node]
+            self.releaseTree(node)
+            node = parentId
+
+    '''
+    Removes a file or a directory and everything beneath it
+    Returns True if anything was removed
+    '''
+    def remove(self, path) -> bool:
+        node = self.findNode(path)
+        if node is None or node == self.ROOT:
+            return False
+
+        parentId = self.parent[node]
+        self.releaseTree(node)
+        self.pruneEmpty(parentId)
+        return True
+
+    '''
+    Moves / renames a file or directory - directories carry their whole subtree with them
+    Any existing state at the new path is replaced
+    Returns True if the old path existed
+    '''
+    def move(self, oldPath, newPath) -> bool:
+        node = self.findNode(oldPath)
+        if node is None or node == self.ROOT:
+            return False
+
+        newParts = self.splitPath(newPath)
+        if not newParts:
+            return False
+        if self.findNode(newPath) == node:
+            return True
+        self.remove(newPath)
+
+        newParent = self.ensureNode(PurePath(*newParts[:-1])) if len(newParts) > 1 else self.ROOT
+        newName = newParts[-1]
+        # A moved directory keeps its name interned like every other directory
+        if node in self.children:
+            newName = sys.intern(newName)
+
+        oldParent = self.parent[node]
+        self.unlink(node)
+        self.names[node] = newName
+        self.parent[node] = newParent
+        self.children.setdefault(newParent, {})[newName] = node
+        self.pruneEmpty(oldParent)
+        return True
+
+    '''
+    Rebuilds the relative Path for a node - only used when a full path is actually needed
+    '''
+    def pathOf(self, node: int) -> PurePath:
+        parts = []
+        while node != self.ROOT:
+            parts.append(self.names[node])
+            node = self.parent[node]
+        return PurePath(*reversed(parts))
+
+    '''
+    Iterates over (path, (size, mtime, digest)) for every tracked file
+    '''
+    def items(self):
+        for node in range(1, len(self.parent)):
+            if self.tracked[node]:
+                yield self.pathOf(node), (self.size[node], self.mtime[node], self.digest[node])
@@ -1,36 +1,20 @@
-import argparse, os
+import argparse, json, os
 from pathlib import Path
 
 """
-    Checks the arguments passed and performs error checking:
-        Correct arguments passed (an argument was parsed and the correct flag(s) were used)
+    Checks the provided directory is valid and usable:
         Checks the provided directory is valid and reachable
         Checks the provided directy has read and write permissions for the user running the program
-    
+
     Behaviour on failed check:
         Program will error out with an appropriate exception and description - without a valid directory or permissions we cannot recover
-        
+
     Returns:
-        A valid directory provided in args
-    
-    If we were being pedantic we may move the error checking to a separate "checkDirectory" function.
+        The directory path that was checked
 """
 
 
-def parseArguments():
-
-    # Setup Argument Parsing for our destination filepath
-    parser = argparse.ArgumentParser()
-    parser.add_argument("-path")
-
-
-    args = parser.parse_args()
-
-    directoryPath = args.path
-
-    # Check that Arguments were actually passed
-    if directoryPath is None:
-        raise ValueError("Bad Arguments passed please use: -path pathName")
+def checkDirectory(directoryPath):
 
     # Error handling for provided directory
     try:
@@ -61,6 +45,93 @@ def parseArguments():
     return directoryPath
 
 
+"""
+    Loads a JSON config file listing several roots to watch (client) or mirror into (server).
+
+    Example config:
+        {
+            "roots": {
+                "photos": "C:\\Users\\Username\\Pictures",
+                "projects": "C:\\Users\\Username\\Documents\\Projects"
+            }
+        }
+
+    The root names are the namespaces shared between the client and server - the client tags every request with the root name
+    and the server uses it to pick which of its configured directories the change is applied to.
+    Every directory is checked with `checkDirectory` and no two roots may be the same directory or nested within each other.
+
+    Returns:
+        A dictionary of root name -> directory path
+"""
+
+
+def loadConfig(configPath):
+    try:
+        with open(configPath, "r") as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError('Config file at: "' + configPath + '" cannot be found')
+    except json.JSONDecodeError as e:
+        raise ValueError('Config file at: "' + configPath + '" is not valid JSON: ' + str(e))
+
+    roots = config.get("roots") if isinstance(config, dict) else None
+    if not isinstance(roots, dict) or not roots:
+        raise ValueError('Config file at: "' + configPath + '" must contain a non-empty "roots" object')
+
+    resolvedRoots = {}
+    for rootName, directoryPath in roots.items():
+        if not rootName or not isinstance(directoryPath, str):
+            raise ValueError('Bad root entry in config: "' + str(rootName) + '"')
+        checkDirectory(directoryPath)
+        resolvedRoots[rootName] = Path(directoryPath).resolve()
+
+    # Roots sharing a directory would merge namespaces on the server, and nested roots would have the client
+    # watch (and upload) the same file under two roots - so every root must be a separate directory tree
+    for rootName, resolvedPath in resolvedRoots.items():
+        for otherName, otherPath in resolvedRoots.items():
+            if rootName != otherName and resolvedPath.is_relative_to(otherPath):
+                raise ValueError(
+                    'Roots "' + rootName + '" and "' + otherName + '" overlap: "' + str(resolvedPath) + '" is within "' + str(otherPath) + '"'
+                )
+
+    return roots
+
+
+"""
+    Checks the arguments passed and performs error checking:
+        Correct arguments passed (an argument was parsed and the correct flag(s) were used)
+        Either a single directory with `-path` or several named roots with `-config`
+        Every directory is validated with `checkDirectory`
+
+    Behaviour on failed check:
+        Program will error out with an appropriate exception and description - without a valid directory or permissions we cannot recover
+
+    Returns:
+        A dictionary of root name -> directory path
+        When `-path` is used the single directory is keyed by `None` - no namespace is used for it
+"""
+
+
+def parseArguments():
+
+    # Setup Argument Parsing for our destination filepath / config file
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("-path")
+    group.add_argument("-config")
+
+    args = parser.parse_args()
+
+    # Check that Arguments were actually passed
+    if args.path is None and args.config is None:
+        raise ValueError("Bad Arguments passed please use: -path pathName or -config configFile")
+
+    if args.config is not None:
+        return loadConfig(args.config)
+
+    return {None: checkDirectory(args.path)}
+
+
 """
    Input: a Path in string format
    
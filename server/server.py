@@ -1,10 +1,70 @@
-import uvicorn, os, shutil
-from fastapi import FastAPI, UploadFile, File, Form, Depends, Query, HTTPException
+import uvicorn, os, shutil, asyncio, json, uuid
+from collections import deque
+from itertools import islice
+from fastapi import FastAPI, UploadFile, File, Form, Depends, Query, HTTPException, Request, Header
+from fastapi.responses import FileResponse, StreamingResponse
 from pathlib import Path
 from dependencies.util import parseArguments
 
+'''
+Change feed of committed operations for followers (see `client/follower.py`)
+
+Every successful upload, delete, rename and directory creation is recorded with an increasing sequence number.
+Followers stream the feed from `/changes` and resume from the last sequence number they applied after a disconnect.
+Sequence numbers restart with each server process so every feed has a random `feedId` - a position is only meaningful as `feedId:sequence`.
+Only the most recent `maxEvents` operations are kept in memory - a follower that falls further behind than this
+(or resumes from a different feed after a server restart) is sent a `reset` event instead as the missing operations cannot be replayed.
+'''
+class ChangeFeed:
+    def __init__(self, maxEvents: int = 10_000):
+        self.events: deque = deque(maxlen=maxEvents)
+        self.feedId = uuid.uuid4().hex
+        self.sequence = 0
+        self.condition = asyncio.Condition()
+
+    '''
+    Records a committed operation and wakes every waiting follower
+    Input:
+        op: One of "upload", "delete", "rename", "mkdir"
+        root: The root name the operation was applied to - None for the single destination
+        fields: The sub paths of the operation - `subPath` or `oldSubPath` + `newSubPath` for a rename
+    '''
+    async def publish(self, op: str, root: str | None, **fields):
+        self.sequence += 1
+        self.events.append({"sequence": self.sequence, "op": op, "root": root or None, **fields})
+        async with self.condition:
+            self.condition.notify_all()
+
+    '''
+    Returns (gap, events) for every operation after `sequence`
+    gap is True when operations after `sequence` are no longer held and so cannot be replayed
+    `feedId` is the feed the sequence came from - None when unknown (a new follower) in which case it is not checked
+    '''
+    def since(self, sequence: int, feedId: str | None = None):
+        if feedId is not None and feedId != self.feedId:
+            return True, []
+        oldest = self.events[0]["sequence"] if self.events else self.sequence + 1
+        if sequence > self.sequence or sequence < oldest - 1:
+            return True, []
+        # Sequence numbers are contiguous so the first new event can be found by offset
+        return False, list(islice(self.events, sequence - oldest + 1, None))
+
+    '''
+    Waits until an operation after `sequence` is published
+    Returns False if nothing was published within `timeout` seconds
+    '''
+    async def wait(self, sequence: int, timeout: float):
+        async with self.condition:
+            try:
+                await asyncio.wait_for(self.condition.wait_for(lambda: self.sequence > sequence), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+
 # Globals - don't like this but FastAPI has forced my hand
 app: FastAPI = FastAPI()
+changeFeed: ChangeFeed = ChangeFeed()
 
 '''
 Function to be overriden for dependency injection
@@ -14,6 +74,37 @@ This will be used to provide the `fullDestination` variable to the FastAPI endpo
 def getDestination():
     return
 
+'''
+Function to be overriden for dependency injection in the same way as `getDestination`
+Provides the mapping of root name -> destination directory when the server is started with a config file
+Each root watched by a client is mirrored into its own namespace (directory) on the server
+'''
+def getNamespaces():
+    return {}
+
+'''
+    Resolves the directory a request should be applied to.
+    Requests without a root use the single `fullDestination` directory (server started with `-path`).
+    Requests with a root use the matching namespace from the config file (server started with `-config`).
+    Input:
+        root: The root name sent by the client - None when the client watches a single directory.
+        fullDestination: The full server path - None when the server was started with a config file.
+        namespaces: Dictionary of root name -> full server path.
+
+    Returns:
+        The full server path to apply the request to
+'''
+def resolveDestination(root: str | None, fullDestination: str | None, namespaces: dict):
+    if not root:
+        if fullDestination is None:
+            raise HTTPException(status_code=400, detail="A root must be supplied for this server")
+        return fullDestination
+
+    # Only configured roots are accepted - the root name is never joined onto a server path
+    if root not in namespaces:
+        raise HTTPException(status_code=404, detail=f"Root not found: {root}")
+    return namespaces[root]
+
 '''
     Saves the uploaded file to the specified subPath within the fullDestination directory.
     Handles directory creation if it does not exist.
@@ -71,8 +162,8 @@ def deleteFileOrDirectory(subPath: str, fullDestination: str):
 '''
     FastAPI endpoints for file operations.
     These endpoints handle file uploads, deletions, renaming, and directory creation.
-    Each endpoint uses the `getDestination` dependency to get the full server path.
-    We override the `getDestination` function in the main block to inject the destination path.
+    Each endpoint uses the `getDestination` and `getNamespaces` dependencies along with the optional `root` field to get the full server path.
+    We override the `getDestination` / `getNamespaces` functions in the main block to inject the destination path(s).
 
     FastAPI creates documentation for these endpoints automatically, which can be accessed at `/docs`.
     To reduce redundancy I will avoid repeating docstrings for each endpoint and instead focus on noting any unique aspects or odd behaviors.
@@ -89,11 +180,15 @@ def deleteFileOrDirectory(subPath: str, fullDestination: str):
 async def createUploadFileEndpoint(
     file: UploadFile = File(...),
     subPath: str = Form(...),
+    root: str | None = Form(None),
     fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
 ):
+    fullDestination = resolveDestination(root, fullDestination, namespaces)
     try:
 
         saveFile(file, subPath, fullDestination)
+        await changeFeed.publish("upload", root, subPath=subPath)
 
         return {
             "message": f"File '{file.filename}' uploaded successfully",
@@ -105,9 +200,13 @@ async def createUploadFileEndpoint(
 @app.delete("/deletefile")
 async def deleteFileEndpoint(
     subPath: str = Query(...),
+    root: str | None = Query(None),
     fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
 ):
+    fullDestination = resolveDestination(root, fullDestination, namespaces)
     deleteFileOrDirectory(subPath, fullDestination)
+    await changeFeed.publish("delete", root, subPath=subPath)
     return {
         "message": f"File or directory deleted at '{subPath}'",
     }
@@ -117,13 +216,17 @@ async def deleteFileEndpoint(
 @app.delete("/deletedirectory")
 async def deleteDirectoryEndpoint(
     subPath: str = Query(...),
+    root: str | None = Query(None),
     fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
 ):
+    fullDestination = resolveDestination(root, fullDestination, namespaces)
     dirPath = Path(fullDestination) / subPath
 
     if dirPath.exists() and dirPath.is_dir():
         try:
             shutil.rmtree(dirPath)
+            await changeFeed.publish("delete", root, subPath=subPath)
             return {
                 "message": f"Directory deleted at '{subPath}'",
             }
@@ -139,8 +242,11 @@ async def deleteDirectoryEndpoint(
 async def renameFileEndpoint(
     oldSubPath: str = Form(...),
     newSubPath: str = Form(...),
+    root: str | None = Form(None),
     fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
 ):
+    fullDestination = resolveDestination(root, fullDestination, namespaces)
     oldPath = Path(fullDestination) / oldSubPath
     newPath = Path(fullDestination) / newSubPath
 
@@ -157,6 +263,7 @@ async def renameFileEndpoint(
 
     try:
         shutil.move(str(oldPath), str(newPath))
+        await changeFeed.publish("rename", root, oldSubPath=oldSubPath, newSubPath=newSubPath)
         return {
             "message": f"File renamed from '{oldSubPath}' to '{newSubPath}'",
         }
@@ -169,8 +276,11 @@ async def renameFileEndpoint(
 async def renameDirectoryEndpoint(
     oldSubPath: str = Form(...),
     newSubPath: str = Form(...),
+    root: str | None = Form(None),
     fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
 ):
+    fullDestination = resolveDestination(root, fullDestination, namespaces)
     oldDirPath = Path(fullDestination) / oldSubPath
     newDirPath = Path(fullDestination) / newSubPath
 
@@ -182,6 +292,7 @@ async def renameDirectoryEndpoint(
     try:
         newDirPath.parent.mkdir(parents=True, exist_ok=True)
         shutil.move(str(oldDirPath), str(newDirPath))
+        await changeFeed.publish("rename", root, oldSubPath=oldSubPath, newSubPath=newSubPath)
         return {
             "message": f"Directory renamed from '{oldSubPath}' to '{newSubPath}'",
         }
@@ -192,8 +303,11 @@ async def renameDirectoryEndpoint(
 @app.post("/createdirectory")
 async def createDirectoryEndpoint(
     subPath: str = Form(...),
+    root: str | None = Form(None),
     fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
 ):
+    fullDestination = resolveDestination(root, fullDestination, namespaces)
     dirPath = Path(fullDestination) / subPath
 
     try:
@@ -207,6 +321,7 @@ async def createDirectoryEndpoint(
                 )
 
         dirPath.mkdir(parents=True, exist_ok=False)
+        await changeFeed.publish("mkdir", root, subPath=subPath)
 
         return {
             "message": f"Directory created at '{subPath}'",
@@ -215,15 +330,161 @@ async def createDirectoryEndpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Directory creation failed: {e}")
 
+'''
+    Resolves `subPath` within `fullDestination`
+    Absolute paths and `..` components could otherwise escape the destination directory - anything outside it is reported as not found
+'''
+def resolveSubPath(subPath: str, fullDestination: str):
+    basePath = Path(fullDestination).resolve()
+    targetPath = (basePath / subPath).resolve()
+
+    if not targetPath.is_relative_to(basePath):
+        raise HTTPException(status_code=404, detail=f"Path not found: {subPath}")
+    return targetPath
+
+
+'''
+    Change feed endpoints for followers.
+    `/changes` is a Server-Sent Events stream - each committed operation is sent as a `change` event with `feedId:sequence` as the event id.
+    A follower resumes by passing the last position it applied as `feed` + `since` (or the standard `Last-Event-ID` header).
+    A follower with no position passes `since=-1` - which is always before the retained window so it is sent a `reset` and reconciles with `/listtree`.
+    Operations for other roots are not sent - instead `progress` events carry the current position so the follower does not fall behind the
+    retained window while its own root is quiet. A `progress` event is also sent when the feed is idle to keep the connection open.
+    `/downloadfile` and `/listtree` are used by followers to fetch the contents of files and directories.
+'''
+def formatEvent(event: str, feedId: str, sequence: int, data: dict):
+    return f"id: {feedId}:{sequence}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+'''
+    Parses an event id as sent in `Last-Event-ID`
+    Returns (feedId, sequence) - feedId is None for a bare sequence number and None is returned for anything unparsable
+'''
+def parseEventId(eventId: str):
+    feedId, _, sequence = eventId.rpartition(":")
+    if not sequence.isdigit():
+        return None
+    return (feedId or None, int(sequence))
+
+
+async def changeStream(request: Request, sequence: int, feedId: str | None, root: str | None):
+    # Send progress for filtered events well before the follower could fall out of the retained window
+    progressInterval = max(1, changeFeed.events.maxlen // 10)
+    sent = sequence
+
+    while True:
+        gap, events = changeFeed.since(sequence, feedId)
+        feedId = changeFeed.feedId
+        if gap:
+            # The missed operations cannot be replayed - the follower continues from the current sequence
+            sequence = sent = changeFeed.sequence
+            yield formatEvent("reset", feedId, sequence, {"sequence": sequence})
+            continue
+
+        for event in events:
+            sequence = event["sequence"]
+            # Followers only apply the operations for the root they mirror
+            if event["root"] == (root or None):
+                yield formatEvent("change", feedId, sequence, event)
+                sent = sequence
+            elif sequence - sent >= progressInterval:
+                yield formatEvent("progress", feedId, sequence, {"sequence": sequence})
+                sent = sequence
+
+        if await request.is_disconnected():
+            return
+        # Idle - report our position, this also keeps idle connections open through proxies and lets us notice disconnected followers
+        if not await changeFeed.wait(sequence, timeout=15):
+            yield formatEvent("progress", feedId, sequence, {"sequence": sequence})
+            sent = sequence
+
+
+@app.get("/changes")
+async def changeFeedEndpoint(
+    request: Request,
+    since: int = Query(0),
+    feed: str | None = Query(None),
+    root: str | None = Query(None),
+    lastEventId: str | None = Header(None, alias="Last-Event-ID"),
+    fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
+):
+    # Check the root like every other endpoint - an unknown root would otherwise stream progress events forever
+    resolveDestination(root, fullDestination, namespaces)
+
+    # Reconnecting EventSource clients send the id of the last event they received
+    position = parseEventId(lastEventId) if lastEventId is not None else None
+    if position is not None:
+        feed, since = position
+
+    return StreamingResponse(
+        changeStream(request, since, feed, root),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/downloadfile")
+async def downloadFileEndpoint(
+    subPath: str = Query(...),
+    root: str | None = Query(None),
+    fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
+):
+    fullDestination = resolveDestination(root, fullDestination, namespaces)
+    filePath = resolveSubPath(subPath, fullDestination)
+
+    if not filePath.is_file():
+        raise HTTPException(status_code=404, detail=f"File not found: {subPath}")
+    return FileResponse(filePath)
+
+
+# Used by followers to catch up on a file or directory whose earlier uploads they could not fetch
+# e.g. a file uploaded and then renamed before the follower applied the upload
+# and with `subPath=""` to reconcile the whole destination after a reset
+# Paths are returned relative to the destination so they can be passed straight back to `/downloadfile`
+@app.get("/listtree")
+async def listTreeEndpoint(
+    subPath: str = Query(...),
+    root: str | None = Query(None),
+    fullDestination: str = Depends(getDestination),
+    namespaces: dict = Depends(getNamespaces),
+):
+    fullDestination = resolveDestination(root, fullDestination, namespaces)
+    basePath = Path(fullDestination).resolve()
+    targetPath = resolveSubPath(subPath, fullDestination)
+
+    if not targetPath.exists():
+        raise HTTPException(status_code=404, detail=f"Path not found: {subPath}")
+
+    files, directories = [], []
+    for path in [targetPath, *sorted(targetPath.rglob("*"))] if targetPath.is_dir() else [targetPath]:
+        # Listing the whole destination (`subPath=""`) - the destination itself is not an entry
+        if path == basePath:
+            continue
+        if path.is_dir():
+            directories.append(path.relative_to(basePath).as_posix())
+        elif path.is_file():
+            files.append({"subPath": path.relative_to(basePath).as_posix(), "size": path.stat().st_size})
+
+    return {"files": files, "directories": directories}
+
+
 if __name__ == "__main__":
     # Parse arguments and perform some permissions / error checks
-    destination = parseArguments()
-    topLevelDir = Path(destination).name
-    print(topLevelDir)
+    roots = parseArguments()
 
-    # Overriding our dummy getDestination function so we can inject the destination
+    # Overriding our dummy getDestination / getNamespaces functions so we can inject the destination(s)
     # To our fastAPI functions
-    app.dependency_overrides[getDestination] = lambda: destination
+    # `-path` gives a single destination keyed by None - `-config` gives one namespace per root
+    if None in roots:
+        destination = roots[None]
+        print(Path(destination).name)
+        app.dependency_overrides[getDestination] = lambda: destination
+    else:
+        for root, destination in roots.items():
+            print(f"Mirroring root: {root} into {destination}")
+        app.dependency_overrides[getNamespaces] = lambda: roots
 
     # Start the application
     uvicorn.run(app)
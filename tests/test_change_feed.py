@@ -0,0 +1,204 @@
+import asyncio
+import io
+import json
+import shutil
+import pytest
+import server.server
+from pathlib import Path
+from fastapi.testclient import TestClient
+from server.server import app, getDestination, getNamespaces, changeFeed, ChangeFeed, changeStream, parseEventId
+
+# Create a temp directory for storing uploaded files
+TEST_DEST_DIR = Path("test_feed_destination")
+TEST_FILE_CONTENT = b"Hello, this is a test file!"
+
+client = TestClient(app)
+# Fixture to set up and remove the test environment
+@pytest.fixture(autouse=True)
+def setup_and_teardown():
+    # Setup: Create clean test directory and point the server at it
+    if TEST_DEST_DIR.exists():
+        shutil.rmtree(TEST_DEST_DIR)
+    TEST_DEST_DIR.mkdir(parents=True)
+    previous = app.dependency_overrides.get(getDestination)
+    app.dependency_overrides[getDestination] = lambda: str(TEST_DEST_DIR)
+    # Yield to allow the test to run
+    yield
+    # Teardown: Restore any override from other test modules and clean up test directory
+    if previous is None:
+        del app.dependency_overrides[getDestination]
+    else:
+        app.dependency_overrides[getDestination] = previous
+    shutil.rmtree(TEST_DEST_DIR)
+
+'''
+ Test case to test that committed operations are recorded in the change feed in order
+ and that a follower can fetch the uploaded file contents.
+'''
+def test_operations_recorded_in_change_feed():
+    start = changeFeed.sequence
+
+    files = {"file": ("test.txt", io.BytesIO(TEST_FILE_CONTENT), "text/plain")}
+    assert client.post("/uploadfile", files=files, data={"subPath": "foo/test.txt"}).status_code == 200
+    assert client.put("/renamefile", data={"oldSubPath": "foo/test.txt", "newSubPath": "foo/renamed.txt"}).status_code == 200
+    assert client.post("/createdirectory", data={"subPath": "bar"}).status_code == 200
+    # Failed operations are not recorded
+    assert client.delete("/deletefile", params={"subPath": "missing.txt"}).status_code == 404
+
+    gap, events = changeFeed.since(start)
+    assert not gap
+    assert [event["op"] for event in events] == ["upload", "rename", "mkdir"]
+    assert [event["sequence"] for event in events] == [start + 1, start + 2, start + 3]
+    assert events[1]["newSubPath"] == "foo/renamed.txt"
+
+    response = client.get("/downloadfile", params={"subPath": "foo/renamed.txt"})
+    assert response.status_code == 200
+    assert response.content == TEST_FILE_CONTENT
+    assert client.get("/downloadfile", params={"subPath": "foo/test.txt"}).status_code == 404
+
+# Helper to publish a list of (op, root, subPath) operations to a feed
+def publishAll(feed, operations):
+    async def run():
+        for op, root, subPath in operations:
+            await feed.publish(op, root, subPath=subPath)
+    asyncio.run(run())
+
+'''
+ Test case for resuming from the retained window - once it wraps around older positions report a gap
+'''
+def test_since_across_wrap_around():
+    feed = ChangeFeed(maxEvents=3)
+    assert feed.since(0) == (False, [])
+
+    publishAll(feed, [("upload", None, f"file{i}.txt") for i in range(5)])
+
+    # Events 1 and 2 have been dropped - a follower at 0 or 1 cannot be caught up
+    assert feed.since(0) == (True, [])
+    assert feed.since(1) == (True, [])
+    gap, events = feed.since(2)
+    assert not gap
+    assert [event["sequence"] for event in events] == [3, 4, 5]
+    assert [event["sequence"] for event in feed.since(4)[1]] == [5]
+    assert feed.since(5) == (False, [])
+    # Ahead of the feed - the follower was following an earlier server process
+    assert feed.since(6) == (True, [])
+
+'''
+ Test case for a follower reconnecting to a restarted server - the sequence alone would look valid but the feed id differs
+'''
+def test_since_after_server_restart():
+    oldFeed = ChangeFeed()
+    publishAll(oldFeed, [("upload", None, f"file{i}.txt") for i in range(5)])
+    newFeed = ChangeFeed()
+    publishAll(newFeed, [("upload", None, f"file{i}.txt") for i in range(6)])
+
+    assert oldFeed.feedId != newFeed.feedId
+    assert newFeed.since(3, oldFeed.feedId) == (True, [])
+    assert not newFeed.since(3, newFeed.feedId)[0]
+
+
+def test_parse_event_id():
+    assert parseEventId("abc:12") == ("abc", 12)
+    assert parseEventId("12") == (None, 12)
+    assert parseEventId("abc:") is None
+    assert parseEventId("") is None
+
+
+# A request that has already disconnected - the stream sends everything pending and then stops
+class DisconnectedRequest:
+    async def is_disconnected(self):
+        return True
+
+
+def collectStream(sequence, feedId, root):
+    async def run():
+        return [chunk async for chunk in changeStream(DisconnectedRequest(), sequence, feedId, root)]
+    return asyncio.run(run())
+
+'''
+ Test case for root filtering - other roots' operations are not sent but progress events keep the follower's position moving
+'''
+def test_change_stream_filters_roots(monkeypatch):
+    feed = ChangeFeed(maxEvents=20)
+    monkeypatch.setattr(server.server, "changeFeed", feed)
+    publishAll(feed, [("mkdir", "a", "one")] + [("mkdir", "b", f"dir{i}") for i in range(5)] + [("mkdir", "a", "two")])
+
+    chunks = collectStream(0, None, "a")
+    # With 20 retained events a progress event is sent every 2 filtered events
+    assert [chunk.split("\n")[:2] for chunk in chunks] == [
+        [f"id: {feed.feedId}:1", "event: change"],
+        [f"id: {feed.feedId}:3", "event: progress"],
+        [f"id: {feed.feedId}:5", "event: progress"],
+        [f"id: {feed.feedId}:7", "event: change"],
+    ]
+    assert json.loads(chunks[-1].split("data: ")[1])["subPath"] == "two"
+
+'''
+ Test case for resuming with a position from another feed - a reset is sent at the current sequence
+'''
+def test_change_stream_resets_unknown_feed(monkeypatch):
+    feed = ChangeFeed()
+    monkeypatch.setattr(server.server, "changeFeed", feed)
+    publishAll(feed, [("mkdir", None, f"dir{i}") for i in range(3)])
+
+    chunks = collectStream(1, "previous-server", None)
+    assert chunks == [f"id: {feed.feedId}:3\nevent: reset\ndata: {json.dumps({'sequence': 3})}\n\n"]
+
+'''
+ Test case for the download and listing endpoints refusing paths outside the destination directory
+'''
+def test_paths_outside_destination_not_found():
+    (TEST_DEST_DIR / "inside.txt").write_bytes(TEST_FILE_CONTENT)
+    outside = Path("test_feed_outside.txt").resolve()
+    outside.write_bytes(TEST_FILE_CONTENT)
+
+    try:
+        for subPath in ["../test_feed_outside.txt", str(outside)]:
+            assert client.get("/downloadfile", params={"subPath": subPath}).status_code == 404
+            assert client.get("/listtree", params={"subPath": subPath}).status_code == 404
+        assert client.get("/downloadfile", params={"subPath": "inside.txt"}).status_code == 200
+    finally:
+        outside.unlink()
+
+
+def test_list_tree():
+    (TEST_DEST_DIR / "foo" / "bar").mkdir(parents=True)
+    (TEST_DEST_DIR / "foo" / "bar" / "test.txt").write_bytes(TEST_FILE_CONTENT)
+
+    response = client.get("/listtree", params={"subPath": "foo"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "files": [{"subPath": "foo/bar/test.txt", "size": len(TEST_FILE_CONTENT)}],
+        "directories": ["foo", "foo/bar"],
+    }
+    assert client.get("/listtree", params={"subPath": "missing"}).status_code == 404
+
+
+def test_list_tree_whole_destination():
+    (TEST_DEST_DIR / "foo").mkdir()
+    (TEST_DEST_DIR / "foo" / "test.txt").write_bytes(TEST_FILE_CONTENT)
+
+    response = client.get("/listtree", params={"subPath": ""})
+    assert response.status_code == 200
+    # The destination itself is not listed - only its contents
+    assert response.json() == {
+        "files": [{"subPath": "foo/test.txt", "size": len(TEST_FILE_CONTENT)}],
+        "directories": ["foo"],
+    }
+
+'''
+ Test case for the change feed checking the root like every other endpoint
+'''
+def test_change_feed_rejects_bad_root():
+    assert client.get("/changes", params={"root": "unknown"}).status_code == 404
+
+    previous = app.dependency_overrides[getDestination]
+    app.dependency_overrides[getDestination] = lambda: None
+    app.dependency_overrides[getNamespaces] = lambda: {"projects": str(TEST_DEST_DIR)}
+    try:
+        # A `-config` server has no single destination so a root is required
+        assert client.get("/changes").status_code == 400
+        assert client.get("/changes", params={"root": "unknown"}).status_code == 404
+    finally:
+        app.dependency_overrides[getDestination] = previous
+        del app.dependency_overrides[getNamespaces]
@@ -0,0 +1,162 @@
+import os
+import time
+import httpx
+import pytest
+from watchdog.events import DirCreatedEvent, DirDeletedEvent, FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent
+from client.client import MyEventHandler
+
+TEST_FILE_CONTENT = b"Hello, this is a test file!"
+# Unusual name so `stripPath` cannot match an earlier component of pytest's tmp_path
+TOP_LEVEL_DIR = "watched_root"
+
+
+'''
+ A fake server for the client built on httpx's MockTransport - records every request and replies with `statusCode`
+'''
+class FakeServer:
+    def __init__(self):
+        self.requests = []
+        self.statusCode = 200
+
+    def handle(self, request: httpx.Request):
+        request.read()
+        self.requests.append(request)
+        return httpx.Response(self.statusCode, json={"message": "ok"})
+
+
+@pytest.fixture
+def source(tmp_path):
+    watched = tmp_path / TOP_LEVEL_DIR
+    watched.mkdir()
+    return watched
+
+
+def makeHandler(server, root=None):
+    client = httpx.Client(transport=httpx.MockTransport(server.handle))
+    return MyEventHandler(topLevelDirectory=TOP_LEVEL_DIR, client=client, root=root)
+
+'''
+ Test case for the root name being sent with every request from a handler watching a named root
+'''
+def test_requests_tagged_with_root(source):
+    server = FakeServer()
+    handler = makeHandler(server, root="projects")
+    (source / "test.txt").write_bytes(TEST_FILE_CONTENT)
+    (source / "foo").mkdir()
+
+    handler.on_created(FileCreatedEvent(str(source / "test.txt")))
+    handler.on_created(DirCreatedEvent(str(source / "foo")))
+    handler.on_deleted(FileDeletedEvent(str(source / "test.txt")))
+
+    upload, mkdir, delete = server.requests
+    # Multipart form for the upload, url encoded form for the directory and query parameters for the deletion
+    assert b'name="root"\r\n\r\nprojects' in upload.content
+    assert b'name="subPath"\r\n\r\ntest.txt' in upload.content
+    assert mkdir.content == b"subPath=foo&root=projects"
+    assert delete.url.params["root"] == "projects"
+    assert delete.url.params["subPath"] == "test.txt"
+
+'''
+ Test case for a handler watching a single `-path` directory - no root is sent
+'''
+def test_requests_without_root(source):
+    server = FakeServer()
+    handler = makeHandler(server)
+    (source / "foo").mkdir()
+
+    handler.on_created(DirCreatedEvent(str(source / "foo")))
+    handler.on_deleted(FileDeletedEvent(str(source / "foo")))
+
+    mkdir, delete = server.requests
+    assert mkdir.content == b"subPath=foo"
+    assert "root" not in delete.url.params
+
+
+# Helper to write a file with an mtime well outside the racy window
+def writeOldFile(path, content):
+    path.write_bytes(content)
+    oldNs = time.time_ns() - 3_600_000_000_000
+    os.utime(path, ns=(oldNs, oldNs))
+
+'''
+ Test case for duplicate modified events - only a file whose size or mtime changed since the last upload is sent again
+'''
+def test_unchanged_file_skipped(source):
+    server = FakeServer()
+    handler = makeHandler(server)
+    filePath = source / "test.txt"
+    writeOldFile(filePath, TEST_FILE_CONTENT)
+
+    handler.on_created(FileCreatedEvent(str(filePath)))
+    assert handler.state.get("test.txt")[2] == 0
+    handler.on_modified(FileModifiedEvent(str(filePath)))
+    assert len(server.requests) == 1
+
+    writeOldFile(filePath, TEST_FILE_CONTENT.upper())
+    handler.on_modified(FileModifiedEvent(str(filePath)))
+    assert len(server.requests) == 2
+
+'''
+ Test case for a same-size rewrite that keeps the mtime (as on a coarse mtime filesystem) just after an upload
+ The entry is racy so its digest is checked and the new content is uploaded
+'''
+def test_racy_rewrite_uploaded(source):
+    server = FakeServer()
+    handler = makeHandler(server)
+    filePath = source / "test.txt"
+    filePath.write_bytes(TEST_FILE_CONTENT)
+    mtimeNs = filePath.stat().st_mtime_ns
+
+    handler.on_created(FileCreatedEvent(str(filePath)))
+    assert handler.state.get("test.txt")[2] != 0
+
+    filePath.write_bytes(TEST_FILE_CONTENT.upper())
+    os.utime(filePath, ns=(mtimeNs, mtimeNs))
+    handler.on_modified(FileModifiedEvent(str(filePath)))
+    assert len(server.requests) == 2
+    assert TEST_FILE_CONTENT.upper() in server.requests[1].content
+
+    # Content now matches the digest of the last upload - skipped
+    handler.on_modified(FileModifiedEvent(str(filePath)))
+    assert len(server.requests) == 2
+
+'''
+ Test cases for keeping the recorded state in line with renames and deletions
+'''
+def test_moved_state(source):
+    server = FakeServer()
+    handler = makeHandler(server)
+    (source / "foo").mkdir()
+    writeOldFile(source / "foo" / "a.txt", TEST_FILE_CONTENT)
+    writeOldFile(source / "foo" / "b.txt", TEST_FILE_CONTENT)
+    handler.on_created(FileCreatedEvent(str(source / "foo" / "a.txt")))
+    handler.on_created(FileCreatedEvent(str(source / "foo" / "b.txt")))
+
+    handler.on_moved(FileMovedEvent(str(source / "foo" / "a.txt"), str(source / "foo" / "c.txt")))
+    assert "foo/a.txt" not in handler.state
+    assert "foo/c.txt" in handler.state
+
+    # A failed rename drops the state so the file is uploaded on its next change
+    server.statusCode = 404
+    handler.on_moved(FileMovedEvent(str(source / "foo" / "b.txt"), str(source / "foo" / "d.txt")))
+    assert "foo/b.txt" not in handler.state
+    assert "foo/d.txt" not in handler.state
+
+
+def test_deleted_state(source):
+    server = FakeServer()
+    handler = makeHandler(server)
+    (source / "foo").mkdir()
+    for name in ["a.txt", "b.txt"]:
+        writeOldFile(source / "foo" / name, TEST_FILE_CONTENT)
+        handler.on_created(FileCreatedEvent(str(source / "foo" / name)))
+    writeOldFile(source / "keep.txt", TEST_FILE_CONTENT)
+    handler.on_created(FileCreatedEvent(str(source / "keep.txt")))
+
+    handler.on_deleted(FileDeletedEvent(str(source / "foo" / "a.txt")))
+    assert "foo/a.txt" not in handler.state
+    assert "foo/b.txt" in handler.state
+
+    handler.on_deleted(DirDeletedEvent(str(source / "foo")))
+    assert "foo/b.txt" not in handler.state
+    assert len(handler.state) == 1
@@ -0,0 +1,245 @@
+import json
+import httpx
+import pytest
+from client.follower import ChangeFollower, parsePosition
+
+TEST_FILE_CONTENT = b"Hello, this is a test file!"
+
+
+'''
+ A fake server for the follower built on httpx's MockTransport
+ `files` holds the server's files as sub path -> contents, `stream` is the body returned from `/changes`
+'''
+class FakeServer:
+    def __init__(self, files=None, stream=""):
+        self.files = files or {}
+        self.stream = stream
+        self.requests = []
+
+    def handle(self, request: httpx.Request):
+        self.requests.append(request)
+        subPath = request.url.params.get("subPath")
+
+        if request.url.path == "/downloadfile":
+            if subPath not in self.files:
+                return httpx.Response(404)
+            return httpx.Response(200, content=self.files[subPath])
+
+        # Like the real server - `subPath=""` lists everything and the destination itself is never an entry
+        if request.url.path == "/listtree":
+            if subPath in self.files:
+                return httpx.Response(200, json={"files": [{"subPath": subPath, "size": len(self.files[subPath])}], "directories": []})
+            prefix = subPath + "/" if subPath else ""
+            inside = [path for path in self.files if path.startswith(prefix)]
+            if not inside and subPath:
+                return httpx.Response(404)
+            directories = set()
+            for path in inside:
+                parts = path.split("/")[:-1]
+                for depth in range(1, len(parts) + 1):
+                    directory = "/".join(parts[:depth])
+                    if directory == subPath or directory.startswith(prefix):
+                        directories.add(directory)
+            files = [{"subPath": path, "size": len(self.files[path])} for path in inside]
+            return httpx.Response(200, json={"files": files, "directories": sorted(directories)})
+
+        if request.url.path == "/changes":
+            return httpx.Response(200, content=self.stream.encode(), headers={"Content-Type": "text/event-stream"})
+
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def destination(tmp_path):
+    mirror = tmp_path / "mirror"
+    mirror.mkdir()
+    return mirror
+
+
+def makeFollower(destination, server):
+    return ChangeFollower(destination=str(destination), client=httpx.Client(transport=httpx.MockTransport(server.handle)))
+
+
+# Helper to hand a change event to the follower as it would arrive from the feed
+def sendChange(follower, sequence, **event):
+    follower.handleEvent("change", f"feed:{sequence}", json.dumps({"sequence": sequence, "root": None, **event}))
+
+
+def test_apply_upload_mkdir_delete(destination):
+    server = FakeServer(files={"foo/test.txt": TEST_FILE_CONTENT})
+    follower = makeFollower(destination, server)
+
+    sendChange(follower, 1, op="upload", subPath="foo/test.txt")
+    assert (destination / "foo" / "test.txt").read_bytes() == TEST_FILE_CONTENT
+
+    sendChange(follower, 2, op="mkdir", subPath="bar/baz")
+    assert (destination / "bar" / "baz").is_dir()
+
+    sendChange(follower, 3, op="delete", subPath="foo/test.txt")
+    sendChange(follower, 4, op="delete", subPath="bar")
+    assert not (destination / "foo" / "test.txt").exists()
+    assert not (destination / "bar").exists()
+    assert follower.position() == "feed:4"
+
+'''
+ Test case for replaying a file that was uploaded then renamed before the follower applied the upload
+ The upload 404s as the file is gone from its old path - the rename must fetch it from the new path
+'''
+def test_replay_upload_then_rename(destination):
+    server = FakeServer(files={"b.txt": TEST_FILE_CONTENT})
+    follower = makeFollower(destination, server)
+
+    sendChange(follower, 1, op="upload", subPath="a.txt")
+    assert not (destination / "a.txt").exists()
+    assert follower.sequence == 1
+
+    sendChange(follower, 2, op="rename", oldSubPath="a.txt", newSubPath="b.txt")
+    assert (destination / "b.txt").read_bytes() == TEST_FILE_CONTENT
+
+
+def test_replay_directory_rename(destination):
+    server = FakeServer(files={"bar/sub/test.txt": TEST_FILE_CONTENT})
+    follower = makeFollower(destination, server)
+
+    sendChange(follower, 1, op="mkdir", subPath="foo")
+    sendChange(follower, 2, op="upload", subPath="foo/sub/test.txt")
+    sendChange(follower, 3, op="rename", oldSubPath="foo", newSubPath="bar")
+
+    assert not (destination / "foo").exists()
+    assert (destination / "bar" / "sub" / "test.txt").read_bytes() == TEST_FILE_CONTENT
+
+'''
+ Test case for events naming paths outside the destination - they are skipped without touching the server or the filesystem
+'''
+def test_unsafe_paths_skipped(destination):
+    server = FakeServer(files={"../escape.txt": TEST_FILE_CONTENT})
+    follower = makeFollower(destination, server)
+    outside = destination.parent / "outside"
+
+    sendChange(follower, 1, op="upload", subPath="../escape.txt")
+    sendChange(follower, 2, op="mkdir", subPath=str(outside))
+    sendChange(follower, 3, op="delete", subPath=".")
+
+    assert not (destination.parent / "escape.txt").exists()
+    assert not outside.exists()
+    assert destination.is_dir()
+    assert server.requests == []
+    assert follower.sequence == 3
+
+'''
+ Test case for a change that fails locally - the error is raised and the position is not advanced so it is retried
+ After `maxAttempts` the local file in the way is replaced by the server's directory and the follower moves on
+'''
+def test_failed_change_retried_then_recovered(destination):
+    follower = makeFollower(destination, FakeServer(files={"taken/inner.txt": TEST_FILE_CONTENT}))
+    (destination / "taken").write_bytes(TEST_FILE_CONTENT)
+
+    sendChange(follower, 1, op="mkdir", subPath="ok")
+    for _ in range(follower.maxAttempts - 1):
+        with pytest.raises(OSError):
+            sendChange(follower, 2, op="mkdir", subPath="taken")
+        assert follower.position() == "feed:1"
+
+    sendChange(follower, 2, op="mkdir", subPath="taken")
+    assert follower.position() == "feed:2"
+    assert (destination / "taken" / "inner.txt").read_bytes() == TEST_FILE_CONTENT
+
+
+def test_download_below_local_file_recovered(destination):
+    follower = makeFollower(destination, FakeServer(files={"foo/test.txt": TEST_FILE_CONTENT}))
+    (destination / "foo").write_bytes(TEST_FILE_CONTENT)
+
+    for _ in range(follower.maxAttempts - 1):
+        with pytest.raises(OSError):
+            sendChange(follower, 1, op="upload", subPath="foo/test.txt")
+    sendChange(follower, 1, op="upload", subPath="foo/test.txt")
+
+    assert (destination / "foo" / "test.txt").read_bytes() == TEST_FILE_CONTENT
+    assert follower.position() == "feed:1"
+
+
+def test_progress_and_reset_events(destination):
+    follower = makeFollower(destination, FakeServer())
+
+    follower.handleEvent("progress", "feed:10", json.dumps({"sequence": 10}))
+    assert follower.position() == "feed:10"
+
+    follower.handleEvent("reset", "newfeed:3", json.dumps({"sequence": 3}))
+    assert follower.position() == "newfeed:3"
+
+'''
+ Test case for a reset - the missed operations cannot be replayed so the whole mirror is reconciled with the server
+'''
+def test_reset_resyncs_mirror(destination):
+    server = FakeServer(files={
+        "changed.txt": TEST_FILE_CONTENT,
+        "new/dir/test.txt": TEST_FILE_CONTENT,
+        "conflict/test.txt": TEST_FILE_CONTENT,
+    })
+    follower = makeFollower(destination, server)
+    (destination / "stale.txt").write_bytes(TEST_FILE_CONTENT)
+    (destination / "olddir" / "sub").mkdir(parents=True)
+    (destination / "olddir" / "sub" / "test.txt").write_bytes(TEST_FILE_CONTENT)
+    (destination / "changed.txt").write_bytes(b"old")
+    (destination / "conflict").write_bytes(TEST_FILE_CONTENT)
+
+    follower.handleEvent("reset", "feed:7", json.dumps({"sequence": 7}))
+
+    assert sorted(path.relative_to(destination).as_posix() for path in destination.rglob("*")) == [
+        "changed.txt", "conflict", "conflict/test.txt", "new", "new/dir", "new/dir/test.txt",
+    ]
+    assert (destination / "changed.txt").read_bytes() == TEST_FILE_CONTENT
+    assert follower.position() == "feed:7"
+
+'''
+ Test case for a follower with no position - it asks for a reset rather than replaying from 0 and reconciles the mirror
+'''
+def test_follow_without_position(destination):
+    server = FakeServer(files={"test.txt": TEST_FILE_CONTENT}, stream="id: feed:20\nevent: reset\ndata: {\"sequence\": 20}\n\n")
+    follower = makeFollower(destination, server)
+    assert follower.position() is None
+
+    follower.follow()
+
+    request = server.requests[0]
+    assert request.url.params["since"] == "-1"
+    assert "Last-Event-ID" not in request.headers
+    assert (destination / "test.txt").read_bytes() == TEST_FILE_CONTENT
+    assert follower.position() == "feed:20"
+
+'''
+ Test case for saving the position after each event so a restarted follower can resume
+'''
+def test_position_saved(destination, tmp_path):
+    statePath = tmp_path / ".mirror.follower"
+    follower = ChangeFollower(
+        destination=str(destination), client=httpx.Client(transport=httpx.MockTransport(FakeServer().handle)), statePath=statePath
+    )
+
+    sendChange(follower, 4, op="mkdir", subPath="foo")
+    assert statePath.read_text() == "feed:4"
+    assert parsePosition(statePath.read_text()) == ("feed", 4)
+    assert parsePosition("12") == (None, 12)
+    assert parsePosition("feed:") is None
+
+'''
+ Test case for reading the Server-Sent Events stream - the position is sent when connecting and updated from each event
+'''
+def test_follow_stream(destination):
+    change = {"sequence": 6, "op": "mkdir", "root": None, "subPath": "foo"}
+    server = FakeServer(stream=(
+        f"id: feed:6\nevent: change\ndata: {json.dumps(change)}\n\n"
+        ": comment\n\n"
+        "id: feed:9\nevent: progress\ndata: {\"sequence\": 9}\n\n"
+    ))
+    follower = ChangeFollower(
+        destination=str(destination), client=httpx.Client(transport=httpx.MockTransport(server.handle)), since=5, feedId="feed"
+    )
+
+    follower.follow()
+
+    request = server.requests[0]
+    assert request.headers["Last-Event-ID"] == "feed:5"
+    assert request.url.params["feed"] == "feed"
+    assert (destination / "foo").is_dir()
+    assert follower.position() == "feed:9"
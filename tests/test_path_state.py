@@ -0,0 +1,100 @@
+import tracemalloc
+from pathlib import Path
+from dependencies.pathstate import PathStateStore
+
+# Number of files used for the memory benchmark - large enough for per-file costs to dominate
+BENCHMARK_FILES = 50_000
+
+
+'''
+ Test case for storing, replacing and removing the state of single files
+'''
+def test_set_get_remove():
+    store = PathStateStore()
+    store.set("foo/bar/test.txt", 10, 1_000, 42)
+    store.set(Path("foo/other.txt"), 20, 2_000)
+
+    assert len(store) == 2
+    assert store.get(Path("foo/bar/test.txt")) == (10, 1_000, 42)
+    assert store.get("foo/other.txt") == (20, 2_000, 0)
+    # Intermediate directories are not tracked files
+    assert "foo/bar" not in store
+    assert store.get("missing.txt") is None
+
+    store.set("foo/bar/test.txt", 11, 1_001)
+    assert len(store) == 2
+    assert store.get("foo/bar/test.txt") == (11, 1_001, 0)
+
+    assert store.remove("foo/bar/test.txt")
+    assert not store.remove("foo/bar/test.txt")
+    assert len(store) == 1
+    # The emptied "foo/bar" node is released
+    assert store.findNode("foo/bar") is None
+
+
+'''
+ Test case for directory renames and deletions - the whole subtree should follow the directory
+'''
+def test_move_and_remove_directory():
+    store = PathStateStore()
+    for i in range(5):
+        store.set(f"foo/sub/file{i}.txt", i, i)
+    store.set("keep.txt", 1, 1)
+
+    assert store.move("foo", "bar/renamed")
+    assert store.get("foo/sub/file3.txt") is None
+    assert store.get("bar/renamed/sub/file3.txt") == (3, 3, 0)
+    assert sorted(str(path.as_posix()) for path, _ in store.items())[:2] == [
+        "bar/renamed/sub/file0.txt",
+        "bar/renamed/sub/file1.txt",
+    ]
+
+    # A rename over an existing file replaces it
+    assert store.move("keep.txt", "bar/renamed/sub/file0.txt")
+    assert store.get("bar/renamed/sub/file0.txt") == (1, 1, 0)
+    assert len(store) == 5
+
+    assert store.remove("bar")
+    assert len(store) == 0
+    assert list(store.items()) == []
+
+
+'''
+ Memory benchmark against a naive dict of Path -> (size, mtime, hash)
+ Uses tracemalloc to measure the memory allocated for each structure while the same files are inserted
+'''
+def measure(build):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def test_memory_per_file_against_dict_of_path():
+    paths = [
+        f"projects/project{i % 50}/src/module{i % 400}/file{i}.py"
+        for i in range(BENCHMARK_FILES)
+    ]
+
+    def buildNaive():
+        naive = {}
+        for i, path in enumerate(paths):
+            naive[Path(path)] = (i, 1_700_000_000_000_000_000 + i, i * 31)
+        return naive
+
+    def buildCompact():
+        store = PathStateStore()
+        for i, path in enumerate(paths):
+            store.set(path, i, 1_700_000_000_000_000_000 + i, i * 31)
+        return store
+
+    naiveBytes = measure(buildNaive) / BENCHMARK_FILES
+    compactBytes = measure(buildCompact) / BENCHMARK_FILES
+    print(f"dict of Path: {naiveBytes:.0f} bytes / file, PathStateStore: {compactBytes:.0f} bytes / file")
+
+    assert compactBytes * 2 < naiveBytes
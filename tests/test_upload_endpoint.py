@@ -5,7 +5,7 @@ import pytest
 from pathlib import Path
 from fastapi.testclient import TestClient
 from fastapi import FastAPI, Depends, UploadFile, File, Form
-from server.server import app, getDestination
+from server.server import app, getDestination, getNamespaces
 
 # Create a temp directory for storing uploaded files
 TEST_DEST_DIR = Path("test_destination")
@@ -56,3 +56,44 @@ def test_upload_file_success():
     # Ensure the content is correct
     with open(uploaded_file_path, "rb") as f:
         assert f.read() == TEST_FILE_CONTENT
+
+'''
+ Test case to test the upload file endpoint with a named root
+ The server should save the file into the namespace configured for that root and reject unknown roots.
+'''
+def test_upload_file_to_root_namespace():
+    root_dir = TEST_DEST_DIR / "projects"
+    root_dir.mkdir()
+    app.dependency_overrides[getNamespaces] = lambda: {"projects": str(root_dir)}
+
+    try:
+        files = {"file": ("test.txt", io.BytesIO(TEST_FILE_CONTENT), "text/plain")}
+        response = client.post("/uploadfile", files=files, data={"subPath": "test.txt", "root": "projects"})
+        assert response.status_code == 200
+        with open(root_dir / "test.txt", "rb") as f:
+            assert f.read() == TEST_FILE_CONTENT
+        # The single destination directory is left untouched
+        assert not (TEST_DEST_DIR / "test.txt").exists()
+
+        files = {"file": ("test.txt", io.BytesIO(TEST_FILE_CONTENT), "text/plain")}
+        response = client.post("/uploadfile", files=files, data={"subPath": "test.txt", "root": "unknown"})
+        assert response.status_code == 404
+    finally:
+        del app.dependency_overrides[getNamespaces]
+
+'''
+ Test case for a server started with `-config` - there is no single destination so requests must name a root
+'''
+def test_upload_file_without_root_on_config_server():
+    previous = app.dependency_overrides[getDestination]
+    app.dependency_overrides[getDestination] = lambda: None
+    app.dependency_overrides[getNamespaces] = lambda: {"projects": str(TEST_DEST_DIR)}
+
+    try:
+        files = {"file": ("test.txt", io.BytesIO(TEST_FILE_CONTENT), "text/plain")}
+        response = client.post("/uploadfile", files=files, data={"subPath": "test.txt"})
+        assert response.status_code == 400
+        assert not (TEST_DEST_DIR / "test.txt").exists()
+    finally:
+        app.dependency_overrides[getDestination] = previous
+        del app.dependency_overrides[getNamespaces]
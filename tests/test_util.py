@@ -0,0 +1,74 @@
+import json
+import sys
+import pytest
+from dependencies.util import loadConfig, parseArguments
+
+
+# Helper to write a config file into pytest's tmp_path
+# "{tmp}" in the content is replaced with tmp_path so configs can refer to real directories
+def writeConfig(tmp_path, content):
+    configPath = tmp_path / "config.json"
+    content = content if isinstance(content, str) else json.dumps(content)
+    configPath.write_text(content.replace("{tmp}", tmp_path.as_posix()))
+    return str(configPath)
+
+'''
+ Test case for a valid config file - every root is returned keyed by its name
+'''
+def test_load_config(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    configPath = writeConfig(tmp_path, {"roots": {"a": str(tmp_path / "a"), "b": str(tmp_path / "b")}})
+
+    assert loadConfig(configPath) == {"a": str(tmp_path / "a"), "b": str(tmp_path / "b")}
+
+'''
+ Test cases for config files that should be rejected
+'''
+@pytest.mark.parametrize(
+    "content",
+    [
+        "{not json",
+        {},
+        {"roots": {}},
+        {"roots": ["a"]},
+        {"roots": {"a": 1}},
+        # Two roots sharing a directory
+        {"roots": {"a": "{tmp}/a", "b": "{tmp}/a/../a"}},
+        # One root nested in another
+        {"roots": {"a": "{tmp}/a", "b": "{tmp}/a/sub"}},
+        {"roots": {"a": "{tmp}/a/sub", "b": "{tmp}/a"}},
+    ],
+)
+def test_load_config_rejects_bad_config(tmp_path, content):
+    (tmp_path / "a" / "sub").mkdir(parents=True)
+    with pytest.raises(ValueError):
+        loadConfig(writeConfig(tmp_path, content))
+
+
+def test_load_config_rejects_missing_directory(tmp_path):
+    configPath = writeConfig(tmp_path, {"roots": {"a": str(tmp_path / "missing")}})
+    with pytest.raises(FileNotFoundError):
+        loadConfig(configPath)
+
+    with pytest.raises(FileNotFoundError):
+        loadConfig(str(tmp_path / "missing.json"))
+
+'''
+ Test cases for the command line arguments - `-path` gives a single un-namespaced root, `-config` gives named roots
+'''
+def test_parse_arguments_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["client", "-path", str(tmp_path)])
+    assert parseArguments() == {None: str(tmp_path)}
+
+
+def test_parse_arguments_config(tmp_path, monkeypatch):
+    configPath = writeConfig(tmp_path, {"roots": {"a": str(tmp_path)}})
+    monkeypatch.setattr(sys, "argv", ["client", "-config", configPath])
+    assert parseArguments() == {"a": str(tmp_path)}
+
+
+def test_parse_arguments_missing(monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["client"])
+    with pytest.raises(ValueError):
+        parseArguments()